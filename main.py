@@ -5,13 +5,13 @@ import pandas as pd
 import numpy as np
 from dash.dependencies import Output, Input
 from datetime import datetime
+import os
 import sqlite3
+import subprocess
+import sys
+import threading
 import dash_bootstrap_components as dbc
-import plotly.express as px
 import plotly.graph_objects as go
-import dash_table
-import matplotlib.cm
-from scipy.stats import chi2_contingency
 
 # !!!! ATENÇÃO !!!!
 # Dados originalmente obtidos do Crime Open Database ( https://osf.io/zyaqn/ ) e convertidos para um banco de dados
@@ -20,24 +20,92 @@ from scipy.stats import chi2_contingency
 #
 # Link do repositório do projeto:
 # https://github.com/lmreia/Crimes-CODE
+#
+# O app é construído por create_app(). Importar este módulo ou chamar create_app() não abre o banco nem carrega
+# scipy, matplotlib, plotly express ou dash_table: os dados são lidos na primeira requisição e esses módulos são
+# importados dentro das funções que os usam (tests/test_importacao.py verifica isso). Para o gunicorn, use o wsgi.py
+# com --preload, que carrega os dados e os módulos pesados no processo mestre antes do fork, compartilhando-os
+# (copy-on-write) entre os workers:
+#   gunicorn --preload wsgi:server
+# Para ver o tempo de importação de cada módulo: python main.py --profile-imports
 
-# Create a SQL connection to our SQLite database
-conn = sqlite3.connect("CODE_Data/code_data.sqlite", check_same_thread=False)
+CAMINHO_BANCO = "CODE_Data/code_data.sqlite"
 
-# Adquirindo os valores possíveis para cada coluna do banco
-dateparse = lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S')
-min_date = dateparse(pd.read_sql_query("SELECT min(date_single) FROM code_data", conn).values[0, 0])
-max_date = dateparse(pd.read_sql_query("SELECT max(date_single) FROM code_data", conn).values[0, 0])
-possible_offenses = np.sort(
-    pd.read_sql_query("SELECT DISTINCT offense_type FROM code_data ORDER BY offense_type", conn).offense_type.unique())
-possible_cities = np.sort(
-    pd.read_sql_query("SELECT DISTINCT city_name FROM code_data ORDER BY city_name", conn).city_name.unique())
-possible_years = np.sort(np.unique(
-    pd.read_sql_query("SELECT DISTINCT strftime('%Y',date_single) FROM code_data ORDER BY date_single", conn).values))
+_conexao = None
+_conexao_pid = None
+_dados = None
+_dados_lock = threading.Lock()
+
+
+# Create a SQL connection to our SQLite database
+def obter_conexao():
+    # Cada processo abre a sua própria conexão: uma conexão sqlite herdada pelo fork não deve ser usada pelos workers
+    global _conexao, _conexao_pid
+    if _conexao is None or _conexao_pid != os.getpid():
+        _conexao = sqlite3.connect(CAMINHO_BANCO, check_same_thread=False)
+        _conexao_pid = os.getpid()
+    return _conexao
+
+
+def fechar_conexao():
+    global _conexao, _conexao_pid
+    if _conexao is not None:
+        _conexao.close()
+    _conexao = None
+    _conexao_pid = None
+
+
+# Adquirindo os valores possíveis para cada coluna do banco (uma única vez por processo)
+def carregar_dados():
+    if _dados is None:
+        # As primeiras requisições podem chegar juntas no servidor threaded; só uma delas faz a leitura
+        with _dados_lock:
+            if _dados is None:
+                _ler_dados()
+    return _dados
+
+
+def _ler_dados():
+    global _dados
+    conn = obter_conexao()
+    dateparse = lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S')
+    min_date = dateparse(pd.read_sql_query("SELECT min(date_single) FROM code_data", conn).values[0, 0])
+    max_date = dateparse(pd.read_sql_query("SELECT max(date_single) FROM code_data", conn).values[0, 0])
+    possible_offenses = np.sort(
+        pd.read_sql_query("SELECT DISTINCT offense_type FROM code_data ORDER BY offense_type", conn).offense_type.unique())
+    possible_cities = np.sort(
+        pd.read_sql_query("SELECT DISTINCT city_name FROM code_data ORDER BY city_name", conn).city_name.unique())
+    possible_years = np.sort(np.unique(
+        pd.read_sql_query("SELECT DISTINCT strftime('%Y',date_single) FROM code_data ORDER BY date_single", conn).values))
+
+    vetores_cidades, corr_table, posicoes_cidades, chi2, p_value = pre_calculo_correlacao(conn)
+
+    _dados = {
+        "min_date": min_date,
+        "max_date": max_date,
+        "possible_offenses": possible_offenses,
+        "possible_cities": possible_cities,
+        "possible_years": possible_years,
+        "vetores_cidades": vetores_cidades,
+        "corr_table": corr_table,
+        "posicoes_cidades": posicoes_cidades,
+        "chi2": chi2,
+        "p_value": p_value,
+    }
+
+
+# Módulos usados apenas dentro dos callbacks. São importados sob demanda, exceto quando o app é pré-carregado
+def importar_modulos_pesados():
+    import scipy.stats  # noqa: F401
+    import plotly.express  # noqa: F401
+    import dash_table  # noqa: F401
+    import matplotlib.cm  # noqa: F401
 
 
 # Pré-calculando alguns parâmetros da aba de correlação entre cidades---------------------------------------------------
-def pre_calculo_correlacao():
+def pre_calculo_correlacao(conn):
+    from scipy.stats import chi2_contingency
+
     # Adquirindo a contagem de ocorrência de cada combinação cidade-crime
     filtered_data = pd.read_sql_query(
         "SELECT city_name,offense_type,Count(*) FROM code_data GROUP BY city_name,offense_type ORDER BY city_name,offense_type",
@@ -82,7 +150,6 @@ def pre_calculo_correlacao():
     return E, CorrTable, cities_positions, chi2, p_value
 
 
-vetores_cidades, corr_table, posicoes_cidades, chi2, p_value = pre_calculo_correlacao()
 # -----------------------------------------------------------------------------------------------------------------------
 
 # para pegar a contagem de cada crime diretamente em sql
@@ -95,288 +162,311 @@ external_stylesheets = [
     },
     dbc.themes.BOOTSTRAP
 ]
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-server = app.server
-app.title = "Crimes CODE"
-
-app.layout = html.Div(
-    children=[
-        dcc.ConfirmDialog(
-            id='confirm_resumo',
-            message='Nenhuma ofensa registrada',
-        ),
-        dcc.ConfirmDialog(
-            id='confirm_resumo_crime',
-            message='Nenhuma ofensa registrada',
-        ),
-        dcc.ConfirmDialog(
-            id='confirm_geo',
-            message='Nenhuma ofensa registrada',
-        ),
-        html.Div(
-            children=[
-                html.H1(
-                    children="Dados sobre crimes com base no Crime Open Database (CODE)", className="header-title"
-                ),
-                html.P(
-                    children="Análise de ofensas cometidas em cidades dos EUA",
-                    className="header-description",
-                ),
-            ],
-            className="header",
-        ),
-        dcc.Tabs(id='main-tabs', value='tab_cidade', className="tab_bar", children=[
-            dcc.Tab(label='Resumo sobre Cidade', value='tab_cidade', children=[
-                html.Div(children="Cidade:", className="menu-title"),
-                dcc.Dropdown(
-                    id="filtro-cidade-resumo",
-                    options=[
-                        {"label": region, "value": region}
-                        for region in possible_cities
-                    ],
-                    value=possible_cities[0],
-                    clearable=False,
-                    className="dropdown",
-                ),
-                dcc.Loading(
-                    id="loading-resumo",
-                    type="default",
-                    children=[
-                        html.Div(
-                            children=dcc.Graph(
-                                id="cidade-histograma-crimes",
-                                # config={"displayModeBar": False},
+
+
+# Callbacks registrados em cada app criado por create_app()
+_callbacks = []
+
+
+def callback(*args, **kwargs):
+    def registrar(func):
+        _callbacks.append((func, args, kwargs))
+        return func
+
+    return registrar
+
+
+# O layout depende dos dados do banco; é gerado por função para que os dados só sejam lidos na primeira requisição
+def criar_layout():
+    dados = carregar_dados()
+    return montar_layout(dados["possible_offenses"], dados["possible_cities"], dados["possible_years"])
+
+
+# Esqueleto do layout, sem dados, usado pelo Dash para validar os callbacks. Sem ele o Dash 1.x chamaria
+# criar_layout() já ao atribuir app.layout, lendo o banco dentro de create_app()
+def criar_layout_validacao():
+    return montar_layout([""], [""], [""])
+
+
+def montar_layout(possible_offenses, possible_cities, possible_years):
+    return html.Div(
+        children=[
+            dcc.ConfirmDialog(
+                id='confirm_resumo',
+                message='Nenhuma ofensa registrada',
+            ),
+            dcc.ConfirmDialog(
+                id='confirm_resumo_crime',
+                message='Nenhuma ofensa registrada',
+            ),
+            dcc.ConfirmDialog(
+                id='confirm_geo',
+                message='Nenhuma ofensa registrada',
+            ),
+            html.Div(
+                children=[
+                    html.H1(
+                        children="Dados sobre crimes com base no Crime Open Database (CODE)", className="header-title"
+                    ),
+                    html.P(
+                        children="Análise de ofensas cometidas em cidades dos EUA",
+                        className="header-description",
+                    ),
+                ],
+                className="header",
+            ),
+            dcc.Tabs(id='main-tabs', value='tab_cidade', className="tab_bar", children=[
+                dcc.Tab(label='Resumo sobre Cidade', value='tab_cidade', children=[
+                    html.Div(children="Cidade:", className="menu-title"),
+                    dcc.Dropdown(
+                        id="filtro-cidade-resumo",
+                        options=[
+                            {"label": region, "value": region}
+                            for region in possible_cities
+                        ],
+                        value=possible_cities[0],
+                        clearable=False,
+                        className="dropdown",
+                    ),
+                    dcc.Loading(
+                        id="loading-resumo",
+                        type="default",
+                        children=[
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="cidade-histograma-crimes",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
-                            children=dcc.Graph(
-                                id="cidade-histograma-anos",
-                                # config={"displayModeBar": False},
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="cidade-histograma-anos",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
-                            children=dcc.Graph(
-                                id="cidade-boxplot-meses",
-                                # config={"displayModeBar": False},
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="cidade-boxplot-meses",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
-                            children=[
-                                "Padrões identificados: de modo geral, os meses correspondentes ao inverno nos Estados Unidos (Dezembro, Janeiro e Fevereiro) apresentam uma quantidade de ocorrência de crimes menor que os meses do verão (Junho, Julho e Agosto). Isto pode indicar que a temperatura do clima possivelmente influencia a ocorrência de crimes."],
-                            className="text_card",
-                        ),
-                    ]
-                ),
+                            html.Div(
+                                children=[
+                                    "Padrões identificados: de modo geral, os meses correspondentes ao inverno nos Estados Unidos (Dezembro, Janeiro e Fevereiro) apresentam uma quantidade de ocorrência de crimes menor que os meses do verão (Junho, Julho e Agosto). Isto pode indicar que a temperatura do clima possivelmente influencia a ocorrência de crimes."],
+                                className="text_card",
+                            ),
+                        ]
+                    ),
 
-            ]),
-            dcc.Tab(label='Resumo sobre Crime', value='tab_crime', children=[
-                html.Div(children="Crime:", className="menu-title"),
-                dcc.Dropdown(
-                    id="filtro-crime-resumo",
-                    options=[
-                        {"label": offense, "value": offense}
-                        for offense in possible_offenses
-                    ],
-                    value=possible_offenses[0],
-                    clearable=False,
-                    className="dropdown",
-                ),
-                dcc.Loading(
-                    id="loading-resumo-crime",
-                    type="default",
-                    children=[
-                        html.Div(
-                            children=dcc.Graph(
-                                id="crime-histograma-cidades",
-                                # config={"displayModeBar": False},
+                ]),
+                dcc.Tab(label='Resumo sobre Crime', value='tab_crime', children=[
+                    html.Div(children="Crime:", className="menu-title"),
+                    dcc.Dropdown(
+                        id="filtro-crime-resumo",
+                        options=[
+                            {"label": offense, "value": offense}
+                            for offense in possible_offenses
+                        ],
+                        value=possible_offenses[0],
+                        clearable=False,
+                        className="dropdown",
+                    ),
+                    dcc.Loading(
+                        id="loading-resumo-crime",
+                        type="default",
+                        children=[
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="crime-histograma-cidades",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
-                            children=dcc.Graph(
-                                id="crime-histograma-anos",
-                                # config={"displayModeBar": False},
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="crime-histograma-anos",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="crime-boxplot-meses",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
+                            ),
+                            html.Div(
+                                children=[
+                                    "Padrões identificados: de modo geral, os meses correspondentes ao inverno nos Estados Unidos (Dezembro, Janeiro e Fevereiro) apresentam uma quantidade de ocorrência de crimes menor que os meses do verão (Junho, Julho e Agosto). Isto pode indicar que a temperatura do clima possivelmente influencia a ocorrência de crimes."],
+                                className="text_card",
+                            ),
+                        ]
+                    ),
+                ]),
+                dcc.Tab(label='Visualização Geográfica', value='tab_geo', children=[
+
+                    dbc.Row(
+                        [
+                            dbc.Col(html.Div(
+                                children=[
+                                    html.Div(children="Cidade:", className="menu-title"),
+                                ],
+                            ), width=2),
+                            dbc.Col(html.Div(
+                                children=[
+                                    dcc.Dropdown(
+                                        id="filtro-cidade-geo",
+                                        options=[
+                                            {"label": region, "value": region}
+                                            for region in possible_cities
+                                        ],
+                                        value=possible_cities[0],
+                                        clearable=False,
+                                        className="dropdown",
+                                    ),
+                                ],
+                            ), width=3),
+                            dbc.Col(html.Div(
+                                children=[
+                                    html.Div(children="Ano:", className="menu-title"),
+                                ],
+                            ), width=2),
+                            dbc.Col(html.Div(
+                                children=[
+                                    dcc.Dropdown(
+                                        id="filtro-data-geo",
+                                        options=[
+                                            {"label": selected_year, "value": selected_year}
+                                            for selected_year in possible_years
+                                        ],
+                                        value=possible_years[0],
+                                        clearable=False,
+                                        searchable=False,
+                                        className="dropdown",
+                                    ),
+                                ],
+                            ), width=2),
+                            dbc.Col(html.Div(
+                                children=[
+                                    dcc.RadioItems(
+                                        id="geo-radio",
+                                        options=[
+                                            {'label': 'Scatter', 'value': 'SCATTER'},
+                                            {'label': 'Density', 'value': 'DENSITY'},
+                                        ],
+                                        value='DENSITY',
+                                        labelStyle={'display': 'inline-block'}
+                                    ),
+                                ],
+                            ), width=3),
+                        ]
+                    ),
+                    dbc.Row(
+                        [
+                            dbc.Col(html.Div(
+                                children=[
+                                    html.Div(children="Tipo de ofensa:", className="menu-title"),
+                                ],
+                            ), width=3),
+                            dbc.Col(html.Div(
+                                children=[
+                                    dcc.Dropdown(
+                                        id="filtro-ofensa-geo",
+                                        options=[
+                                            {"label": offense, "value": offense}
+                                            for offense in possible_offenses
+                                        ],
+                                        value=possible_offenses[0],
+                                        clearable=False,
+                                        searchable=False,
+                                        className="dropdown",
+                                    ),
+                                ],
+                            ), width=9),
+                        ]
+                    ),
+                    dcc.Loading(
+                        id="loading-geo",
+                        type="default",
+                        children=html.Div(
                             children=dcc.Graph(
-                                id="crime-boxplot-meses",
-                                # config={"displayModeBar": False},
+                                id="geo-chart",
+                                # config={"displayModeBar": False},,
+                                className="geo_card",
                             ),
-                            className="card",
-                        ),
-                        html.Div(
-                            children=[
-                                "Padrões identificados: de modo geral, os meses correspondentes ao inverno nos Estados Unidos (Dezembro, Janeiro e Fevereiro) apresentam uma quantidade de ocorrência de crimes menor que os meses do verão (Junho, Julho e Agosto). Isto pode indicar que a temperatura do clima possivelmente influencia a ocorrência de crimes."],
-                            className="text_card",
-                        ),
-                    ]
-                ),
-            ]),
-            dcc.Tab(label='Visualização Geográfica', value='tab_geo', children=[
-
-                dbc.Row(
-                    [
-                        dbc.Col(html.Div(
-                            children=[
-                                html.Div(children="Cidade:", className="menu-title"),
-                            ],
-                        ), width=2),
-                        dbc.Col(html.Div(
-                            children=[
-                                dcc.Dropdown(
-                                    id="filtro-cidade-geo",
-                                    options=[
-                                        {"label": region, "value": region}
-                                        for region in possible_cities
-                                    ],
-                                    value=possible_cities[0],
-                                    clearable=False,
-                                    className="dropdown",
-                                ),
-                            ],
-                        ), width=3),
-                        dbc.Col(html.Div(
-                            children=[
-                                html.Div(children="Ano:", className="menu-title"),
-                            ],
-                        ), width=2),
-                        dbc.Col(html.Div(
-                            children=[
-                                dcc.Dropdown(
-                                    id="filtro-data-geo",
-                                    options=[
-                                        {"label": selected_year, "value": selected_year}
-                                        for selected_year in possible_years
-                                    ],
-                                    value=possible_years[0],
-                                    clearable=False,
-                                    searchable=False,
-                                    className="dropdown",
-                                ),
-                            ],
-                        ), width=2),
-                        dbc.Col(html.Div(
-                            children=[
-                                dcc.RadioItems(
-                                    id="geo-radio",
-                                    options=[
-                                        {'label': 'Scatter', 'value': 'SCATTER'},
-                                        {'label': 'Density', 'value': 'DENSITY'},
-                                    ],
-                                    value='DENSITY',
-                                    labelStyle={'display': 'inline-block'}
-                                ),
-                            ],
-                        ), width=3),
-                    ]
-                ),
-                dbc.Row(
-                    [
-                        dbc.Col(html.Div(
-                            children=[
-                                html.Div(children="Tipo de ofensa:", className="menu-title"),
-                            ],
-                        ), width=3),
-                        dbc.Col(html.Div(
-                            children=[
-                                dcc.Dropdown(
-                                    id="filtro-ofensa-geo",
-                                    options=[
-                                        {"label": offense, "value": offense}
-                                        for offense in possible_offenses
-                                    ],
-                                    value=possible_offenses[0],
-                                    clearable=False,
-                                    searchable=False,
-                                    className="dropdown",
-                                ),
-                            ],
-                        ), width=9),
-                    ]
-                ),
-                dcc.Loading(
-                    id="loading-geo",
-                    type="default",
-                    children=html.Div(
-                        children=dcc.Graph(
-                            id="geo-chart",
-                            # config={"displayModeBar": False},,
                             className="geo_card",
                         ),
-                        className="geo_card",
                     ),
-                ),
-            ]),
-            dcc.Tab(label='Correlação entre Cidades', value='tab_correlacao', children=[
-                dcc.Loading(
-                    id="loading-corr",
-                    type="default",
-                    children=[
-                        html.Label(
-                            "Contagem total de ocorrências para cada combinação crime-cidade (Tabela de Contingência)",
-                            className="text_card"),
-                        html.Div(
-                            id="count_table",
-                            className="card_table",
-                        ),
-                        html.Div(
-                            id="text_chi2",
-                            children=[],
-                            className="text_card",
-                        ),
-                        html.Label("Coeficiente de correlação de Pearson entre cidades com base nos vetores de contagem de crimes",
-                                   className="text_card"),
-                        html.Div(
-                            id="corr_table",
-                            className="card_table",
-                        ),
-                        html.Div(
-                            children=dcc.Graph(
-                                id="corr_image",
-                                # config={"displayModeBar": False},
+                ]),
+                dcc.Tab(label='Correlação entre Cidades', value='tab_correlacao', children=[
+                    dcc.Loading(
+                        id="loading-corr",
+                        type="default",
+                        children=[
+                            html.Label(
+                                "Contagem total de ocorrências para cada combinação crime-cidade (Tabela de Contingência)",
+                                className="text_card"),
+                            html.Div(
+                                id="count_table",
+                                className="card_table",
                             ),
-                            className="card",
-                        ),
-                        html.Label("Visualização da correlação entre cidades",
-                                   className="text_card"),
-                        html.Div(children="Cidade:", className="menu-title"),
-                        dcc.Dropdown(
-                            id="filtro-cidade-corr",
-                            options=[
-                                {"label": region, "value": region}
-                                for region in possible_cities
-                            ],
-                            value=possible_cities[0],
-                            clearable=False,
-                            className="dropdown",
-                        ),
-                        html.Div(
-                            children=dcc.Graph(
-                                id="geo_corr",
-                                # config={"displayModeBar": False},
+                            html.Div(
+                                id="text_chi2",
+                                children=[],
+                                className="text_card",
+                            ),
+                            html.Label("Coeficiente de correlação de Pearson entre cidades com base nos vetores de contagem de crimes",
+                                       className="text_card"),
+                            html.Div(
+                                id="corr_table",
+                                className="card_table",
+                            ),
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="corr_image",
+                                    # config={"displayModeBar": False},
+                                ),
+                                className="card",
+                            ),
+                            html.Label("Visualização da correlação entre cidades",
+                                       className="text_card"),
+                            html.Div(children="Cidade:", className="menu-title"),
+                            dcc.Dropdown(
+                                id="filtro-cidade-corr",
+                                options=[
+                                    {"label": region, "value": region}
+                                    for region in possible_cities
+                                ],
+                                value=possible_cities[0],
+                                clearable=False,
+                                className="dropdown",
+                            ),
+                            html.Div(
+                                children=dcc.Graph(
+                                    id="geo_corr",
+                                    # config={"displayModeBar": False},
+                                    className="geo_card",
+                                ),
                                 className="geo_card",
                             ),
-                            className="geo_card",
-                        ),
-                        html.Div(
-                            children=[
-                                "Os resultados acima permitem identificar que existe uma associação entre a posição geográfica e o padrão de ofensas cometido na cidade. O mapa iterativo mostra os pares de cidades que possuem padrões semelhantes de criminalidade."],
-                            className="text_card",
-                        ),
-                    ],
-                ),
+                            html.Div(
+                                children=[
+                                    "Os resultados acima permitem identificar que existe uma associação entre a posição geográfica e o padrão de ofensas cometido na cidade. O mapa iterativo mostra os pares de cidades que possuem padrões semelhantes de criminalidade."],
+                                className="text_card",
+                            ),
+                        ],
+                    ),
+                ]),
             ]),
-        ]),
-    ]
-)
+        ]
+    )
 
 
-@app.callback(
+@callback(
     [Output("cidade-histograma-crimes", "figure"), Output("cidade-histograma-anos", "figure"),
      Output("cidade-boxplot-meses", "figure"),
      Output('confirm_resumo', 'displayed')],
@@ -389,6 +479,10 @@ def update_charts_resumo_cidade(filtro_cidade, tab_value):
     if tab_value != "tab_cidade":
         return go.Figure(), go.Figure(), go.Figure(), False
 
+    import plotly.express as px
+
+    conn = obter_conexao()
+
     filtered_data_crimes = pd.read_sql_query(
         "SELECT offense_type,COUNT(offense_type) FROM code_data WHERE city_name=:region GROUP BY offense_type ORDER BY COUNT(offense_type)",
         conn, params={"region": filtro_cidade})
@@ -421,7 +515,7 @@ def update_charts_resumo_cidade(filtro_cidade, tab_value):
             filtered_data_crimes.empty or filtered_data_anos.empty or filtered_data_meses.empty)
 
 
-@app.callback(
+@callback(
     [Output("crime-histograma-cidades", "figure"), Output("crime-histograma-anos", "figure"),
      Output("crime-boxplot-meses", "figure"),
      Output('confirm_resumo_crime', 'displayed')],
@@ -434,6 +528,10 @@ def update_charts_resumo_crime(filtro_crime, tab_value):
     if tab_value != "tab_crime":
         return go.Figure(), go.Figure(), go.Figure(), False
 
+    import plotly.express as px
+
+    conn = obter_conexao()
+
     filtered_data_cidades = pd.read_sql_query(
         "SELECT city_name,COUNT(city_name) FROM code_data WHERE offense_type=:offense GROUP BY city_name ORDER BY COUNT(city_name)",
         conn, params={"offense": filtro_crime})
@@ -466,7 +564,7 @@ def update_charts_resumo_crime(filtro_crime, tab_value):
             filtered_data_cidades.empty or filtered_data_anos.empty or filtered_data_meses.empty)
 
 
-@app.callback(
+@callback(
     [Output("geo-chart", "figure"),
      Output('confirm_geo', 'displayed')],
     [
@@ -481,6 +579,10 @@ def update_charts_geo(filtro_cidade, filtro_ofensa, filtro_data, geo_radio, tab_
     if tab_value != "tab_geo":
         return go.Figure(), False
 
+    import plotly.express as px
+
+    conn = obter_conexao()
+
     filtered_data = pd.read_sql_query(
         "SELECT date_single,latitude,longitude,offense_type FROM code_data WHERE city_name=:region AND offense_type=:type AND strftime('%Y',date_single)=:date",
         con=conn, params={
@@ -522,7 +624,7 @@ def update_charts_geo(filtro_cidade, filtro_ofensa, filtro_data, geo_radio, tab_
     return geo_chart_figure, filtered_data.empty
 
 
-@app.callback(
+@callback(
     [Output("count_table", "children"), Output("corr_table", "children"), Output("corr_image", "figure"),
      Output("text_chi2", "children"),],
     [
@@ -533,6 +635,17 @@ def update_tables_corr(tab_value):
     if tab_value != "tab_correlacao":
         return "", "", go.Figure(), ""
 
+    import plotly.express as px
+    import dash_table
+
+    dados = carregar_dados()
+    possible_offenses = dados["possible_offenses"]
+    possible_cities = dados["possible_cities"]
+    vetores_cidades = dados["vetores_cidades"]
+    corr_table = dados["corr_table"]
+    chi2 = dados["chi2"]
+    p_value = dados["p_value"]
+
     # Exibição da tabela com os vetores de ocorrências
     crimes = possible_offenses.copy()
     for i in range(len(crimes)):
@@ -573,7 +686,7 @@ def update_tables_corr(tab_value):
     return table_count, table_corr, figure_corr, text_chi2
 
 
-@app.callback(
+@callback(
     [Output("geo_corr", "figure"), ],
     [
         Input("main-tabs", "value"),
@@ -584,6 +697,13 @@ def update_charts_corr(tab_value, filtro_cidade_geo):
     if tab_value != "tab_correlacao":
         return [go.Figure()]
 
+    import matplotlib.cm
+
+    dados = carregar_dados()
+    possible_cities = dados["possible_cities"]
+    corr_table = dados["corr_table"]
+    posicoes_cidades = dados["posicoes_cidades"]
+
     # Exibição do gráfico mostrando os links entre cidades
     cmap = matplotlib.cm.get_cmap('plasma')
 
@@ -639,5 +759,85 @@ def update_charts_corr(tab_value, filtro_cidade_geo):
     return [geo_corr_figure]
 
 
+# Cria o app Dash. Com preload=True os dados e os módulos pesados são carregados imediatamente, o que permite ao
+# gunicorn (--preload) fazer isso uma única vez no processo mestre e compartilhar o estado com os workers
+def create_app(preload=False):
+    if preload:
+        carregar_dados()
+        importar_modulos_pesados()
+        # Só os dados (somente leitura) devem ser herdados pelos workers; a conexão sqlite não pode atravessar o fork
+        fechar_conexao()
+
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+    app.title = "Crimes CODE"
+    app.validation_layout = criar_layout_validacao()
+    app.layout = criar_layout
+
+    for func, args, kwargs in _callbacks:
+        app.callback(*args, **kwargs)(func)
+
+    return app
+
+
+# Mantém "main:app" e "main:server" funcionando: o app padrão só é criado quando um deles é acessado
+_app = None
+
+
+def __getattr__(name):
+    global _app
+    if name not in ("app", "server"):
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    if _app is None:
+        _app = create_app()
+    return _app if name == "app" else _app.server
+
+
+SEPARADOR_IMPORTACAO = "--- modulos sob demanda ---"
+
+
+# Separa a saída do -X importtime nas seções antes e depois do separador: {secao: [(cumulativo, self, modulo)]}
+def ler_importtime(saida):
+    secoes = {"interpretador + import main": [], "sob demanda": []}
+    secao = "interpretador + import main"
+    for linha in saida.splitlines():
+        if linha.strip() == SEPARADOR_IMPORTACAO:
+            secao = "sob demanda"
+            continue
+        if not linha.startswith("import time:") or "imported package" in linha:
+            continue
+        self_us, cumulativo_us, modulo = linha.split(":", 1)[1].split("|")
+        secoes[secao].append((int(cumulativo_us), int(self_us), modulo.rstrip()))
+    return secoes
+
+
+# Módulos de nível superior têm um único espaço antes do nome; a soma deles é o tempo total da seção
+def tempo_total_importacao(modulos):
+    return sum(cumulativo for cumulativo, _, modulo in modulos if not modulo.startswith("  "))
+
+
+# Relatório do tempo de importação (python -X importtime) de "import main" e dos módulos importados sob demanda
+def relatorio_importacao(top=15):
+    # O flush é necessário: o importtime escreve direto no stderr em C, e antes do Python 3.9 o sys.stderr ligado a
+    # um pipe tem buffer, o que faria o separador sair só no fim do processo
+    codigo = "import sys, main; sys.stderr.write({0!r}); sys.stderr.flush(); main.importar_modulos_pesados()".format(
+        SEPARADOR_IMPORTACAO + "\n")
+    resultado = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    if resultado.returncode != 0:
+        sys.stderr.write(resultado.stderr)
+        return resultado.returncode
+
+    for secao, modulos in ler_importtime(resultado.stderr).items():
+        print("{0}: {1:.1f} ms".format(secao, tempo_total_importacao(modulos) / 1000))
+        print("{0:>12} {1:>12}  {2}".format("cumul. [ms]", "self [ms]", "modulo"))
+        for cumulativo, self_us, modulo in sorted(modulos, reverse=True)[:top]:
+            print("{0:>12.1f} {1:>12.1f}  {2}".format(cumulativo / 1000, self_us / 1000, modulo))
+        print()
+    return 0
+
+
 if __name__ == "__main__":
-    app.run_server(host='0.0.0.0', debug=False)
+    if "--profile-imports" in sys.argv[1:]:
+        sys.exit(relatorio_importacao())
+    create_app().run_server(host='0.0.0.0', debug=False)
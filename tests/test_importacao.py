@@ -0,0 +1,121 @@
+import contextlib
+import importlib.util
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Importar main e criar o app não deve carregar estes módulos nem abrir o banco
+MODULOS_PESADOS = ("scipy", "matplotlib", "plotly.express", "dash_table")
+# Já com create_app(preload=True) estes módulos devem ficar carregados no processo mestre
+MODULOS_PRECARREGADOS = ("scipy.stats", "plotly.express", "matplotlib.cm", "dash_table")
+
+VERIFICACAO = """
+import sys
+import main
+
+def verificar(etapa):
+    carregados = [m for m in {modulos!r} if m in sys.modules]
+    assert not carregados, "{{0}} carregou {{1}}".format(etapa, carregados)
+    assert main._conexao is None, "{{0}} abriu o banco".format(etapa)
+    assert main._dados is None, "{{0}} leu os dados".format(etapa)
+
+verificar("import main")
+main.create_app()
+verificar("create_app()")
+""".format(modulos=MODULOS_PESADOS)
+
+VERIFICACAO_PRELOAD = """
+import sys
+import main
+
+main.CAMINHO_BANCO = sys.argv[1]
+main.create_app(preload=True)
+
+faltando = [m for m in {modulos!r} if m not in sys.modules]
+assert not faltando, "create_app(preload=True) não carregou {{0}}".format(faltando)
+assert main._dados is not None, "create_app(preload=True) não leu os dados"
+assert list(main._dados["possible_cities"]) == ["Austin", "Boston"], main._dados["possible_cities"]
+assert main._conexao is None and main._conexao_pid is None, "a conexão do processo mestre ficou aberta"
+""".format(modulos=MODULOS_PRECARREGADOS)
+
+
+def executar(codigo, *args):
+    return subprocess.run([sys.executable, "-c", codigo] + list(args), cwd=RAIZ,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+def criar_banco(caminho):
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE code_data (city_name TEXT, offense_type TEXT, date_single TEXT, "
+                 "latitude REAL, longitude REAL)")
+    conn.executemany("INSERT INTO code_data VALUES (?, ?, ?, ?, ?)", [
+        ("Austin", "assault", "2019-01-05 10:00:00", 30.27, -97.74),
+        ("Austin", "assault", "2019-02-11 22:30:00", 30.28, -97.75),
+        ("Austin", "burglary", "2020-03-01 08:15:00", 30.26, -97.73),
+        ("Boston", "assault", "2019-07-19 14:00:00", 42.36, -71.06),
+        ("Boston", "burglary", "2020-05-23 01:45:00", 42.35, -71.05),
+        ("Boston", "burglary", "2020-09-30 18:20:00", 42.37, -71.07),
+    ])
+    conn.commit()
+    conn.close()
+
+
+@unittest.skipIf(importlib.util.find_spec("dash") is None, "dash não está instalado")
+class TestImportacao(unittest.TestCase):
+    def test_import_e_create_app_sao_preguicosos(self):
+        resultado = executar(VERIFICACAO)
+        self.assertEqual(resultado.returncode, 0, resultado.stdout)
+
+    def test_create_app_preload_carrega_dados_e_fecha_conexao(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "code_data.sqlite")
+            criar_banco(caminho)
+            resultado = executar(VERIFICACAO_PRELOAD, caminho)
+        self.assertEqual(resultado.returncode, 0, resultado.stdout)
+
+
+@unittest.skipIf(importlib.util.find_spec("dash") is None, "dash não está instalado")
+class TestRelatorioImportacao(unittest.TestCase):
+    def test_ler_importtime_separa_secoes_e_soma_nivel_superior(self):
+        import main
+
+        saida = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 | site",
+            "import time:        20 |         20 |   dash.version",
+            "import time:       300 |        320 | dash",
+            main.SEPARADOR_IMPORTACAO,
+            "import time:        50 |         50 |   scipy._lib",
+            "import time:       400 |        450 | scipy.stats",
+        ])
+        secoes = main.ler_importtime(saida)
+
+        self.assertEqual([m for _, _, m in secoes["interpretador + import main"]],
+                         [" site", "   dash.version", " dash"])
+        self.assertEqual([m for _, _, m in secoes["sob demanda"]], ["   scipy._lib", " scipy.stats"])
+        self.assertEqual(main.tempo_total_importacao(secoes["interpretador + import main"]), 420)
+        self.assertEqual(main.tempo_total_importacao(secoes["sob demanda"]), 450)
+
+    def test_relatorio_importacao_tem_as_duas_secoes(self):
+        import main
+
+        saida = io.StringIO()
+        with contextlib.redirect_stdout(saida):
+            self.assertEqual(main.relatorio_importacao(top=5), 0)
+        secoes = saida.getvalue().split("\n\n")
+
+        self.assertTrue(secoes[0].startswith("interpretador + import main: "), saida.getvalue())
+        self.assertTrue(secoes[1].startswith("sob demanda: "), saida.getvalue())
+        # Cabeçalho + coluna + ao menos um módulo importado sob demanda
+        self.assertGreater(len(secoes[1].splitlines()), 2, saida.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
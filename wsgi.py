@@ -0,0 +1,8 @@
+# Ponto de entrada para o gunicorn (dependência só de implantação, listada no requirements.txt). Use com --preload
+# para que os dados do banco e os módulos pesados sejam carregados uma única vez no processo mestre e compartilhados
+# (copy-on-write) entre os workers:
+#   gunicorn --preload -w 4 -b 0.0.0.0:8050 wsgi:server
+from main import create_app
+
+app = create_app(preload=True)
+server = app.server